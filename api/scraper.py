@@ -1,99 +1,310 @@
 from http.server import BaseHTTPRequestHandler
-import json
+import orjson
 from urllib.parse import parse_qs, urlparse
 import asyncio
-from playwright.async_api import async_playwright
+import atexit
+import os
+import re
+import threading
+from contextlib import asynccontextmanager
+import httpx
+import logging
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from urllib.parse import quote
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+POOL_MIN = int(os.environ.get('POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('POOL_MAX', '3'))
+
+class BrowserPool:
+    """Keeps launched Chromium instances alive across requests"""
+
+    def __init__(self, min_size=POOL_MIN, max_size=POOL_MAX):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pw = None
+        self._queue = None
+        self._size = 0
+        self._lock = None
+
+    async def start(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.pw is not None:
+                return
+            self.pw = await async_playwright().start()
+            self._queue = asyncio.Queue()
+            for _ in range(self.min_size):
+                await self._queue.put(await self._launch())
+
+    async def _launch(self):
+        # Reserve the slot before awaiting so concurrent acquires can't overshoot max_size
+        self._size += 1
+        try:
+            return await self.pw.chromium.launch()
+        except Exception:
+            self._size -= 1
+            raise
+
+    @asynccontextmanager
+    async def acquire(self):
+        await self.start()
+        if self._queue.empty() and self._size < self.max_size:
+            browser = await self._launch()
+        else:
+            browser = await self._queue.get()
+        if not browser.is_connected():
+            self._size -= 1
+            browser = await self._launch()
+        try:
+            yield browser
+        finally:
+            self._queue.put_nowait(browser)
+
+    async def close(self):
+        if self.pw is None:
+            return
+        while not self._queue.empty():
+            browser = self._queue.get_nowait()
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        self._size = 0
+        await self.pw.stop()
+        self.pw = None
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+CONTEXT_OPTIONS = {
+    "user_agent": USER_AGENT,
+    "viewport": {"width": 1366, "height": 768},
+    "locale": "en-US",
+}
+
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+BLOCKED_URL_PARTS = ("google-analytics", "googletagmanager", "doubleclick", "segment.com", "segment.io", "hotjar")
+
+async def block_heavy_resources(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(part in request.url for part in BLOCKED_URL_PARTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# One loop for the lifetime of the process, running on its own thread: the pooled
+# browsers and HTTP connections are bound to it and outlive individual requests.
+# asyncio primitives used on it (the pool's lock, the HTTP semaphore) are created
+# lazily from inside it, because python3.9 binds them to a loop at construction.
+LOOP = asyncio.new_event_loop()
+threading.Thread(target=LOOP.run_forever, name="scraper-loop", daemon=True).start()
+pool = BrowserPool()
+HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    headers={"User-Agent": USER_AGENT, "Accept": "application/json"}
+)
+# Caps in-flight API requests as more sources are added. Connection limits can't do
+# this over HTTP/2, which multiplexes any number of streams on one connection per host
+HTTP_MAX_CONCURRENCY = 8
+_http_sem = None
+
+def http_sem():
+    global _http_sem
+    if _http_sem is None:
+        _http_sem = asyncio.Semaphore(HTTP_MAX_CONCURRENCY)
+    return _http_sem
+
+async def _close_resources():
+    await HTTP.aclose()
+    await pool.close()
+
+@atexit.register
+def _shutdown():
+    try:
+        asyncio.run_coroutine_threadsafe(_close_resources(), LOOP).result(timeout=10)
+    except Exception:
+        # A slow or crashed Chromium must not turn process exit into a traceback
+        logger.warning("Timed out or failed closing scraper resources at exit")
+    finally:
+        LOOP.call_soon_threadsafe(LOOP.stop)
+
+KEYWORDS = ('python', 'java', 'javascript', 'react', 'node', 'sql', 'aws')
+
+# Only a leading boundary, so attached forms (Python3, ReactNative, SQLServer) still count.
+# java must not fire inside javascript, and sql is usually glued to a prefix (MySQL, TSQL, SparkSQL)
+KEYWORD_OVERRIDES = {'java': r'\bjava(?!script)', 'sql': r'sql'}
+KEYWORDS_RE = re.compile(
+    "(" + "|".join(KEYWORD_OVERRIDES.get(kw, r'\b' + re.escape(kw)) for kw in KEYWORDS) + ")",
+    re.IGNORECASE
+)
+
 def extract_keywords(text):
-    keywords = ['python', 'java', 'javascript', 'react', 'node', 'sql', 'aws']
-    found = [kw for kw in keywords if kw.lower() in text.lower()]
-    return list(set(found))[:10]
+    return list(dict.fromkeys(m.lower() for m in KEYWORDS_RE.findall(text)))[:10]
+
+# (card, title, company, salary) selectors for the browser fallback
+MCF_SELECTORS = ['div[id^="job-card"]', 'h3, a', '[class*="company"]', '[class*="salary"]']
+JOBSTREET_SELECTORS = ['article[data-testid="job-card"]', 'h1, h2, a', '[data-automation*="company"]', '[class*="salary"]']
 
-async def scrape_mcf(job_title):
+# Reads every card's fields in a single round trip instead of one per field
+EXTRACT_CARDS_JS = """([cardSel, titleSel, companySel, salarySel]) =>
+    Array.from(document.querySelectorAll(cardSel)).slice(0, 50).map(e => {
+        const q = s => e.querySelector(s);
+        return {
+            title: q(titleSel)?.innerText || '',
+            company: q(companySel)?.innerText || '',
+            salary: q(salarySel)?.innerText ?? 'Competitive',
+        };
+    })"""
+
+def rows_to_jobs(rows, source, description, url, date_posted):
     jobs = []
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
-        
-        url = f"https://www.mycareersfuture.gov.sg/search?search={quote(job_title)}"
-        await page.goto(url, timeout=30000)
-        await asyncio.sleep(3)
-        
-        job_elements = await page.query_selector_all('div[id^="job-card"]')
-        
-        for elem in job_elements[:50]:
-            try:
-                title_elem = await elem.query_selector('h3, a')
-                company_elem = await elem.query_selector('[class*="company"]')
-                salary_elem = await elem.query_selector('[class*="salary"]')
-                
-                title = await title_elem.inner_text() if title_elem else ""
-                company = await company_elem.inner_text() if company_elem else ""
-                salary = await salary_elem.inner_text() if salary_elem else "Competitive"
-                
-                if title and company:
-                    jobs.append({
-                        "job_title": title.strip(),
-                        "employer": company.strip(),
-                        "salary_range": salary.strip(),
-                        "source": "MyCareersFuture",
-                        "date_posted": datetime.now().strftime("%Y-%m-%d"),
-                        "job_description": f"Position at {company}",
-                        "employer_website": url,
-                        "ats_keywords": extract_keywords(f"{title} {company}")
-                    })
-            except:
-                continue
-        
-        await browser.close()
+    for row in rows:
+        title, company = row['title'], row['company']
+        if title and company:
+            jobs.append({
+                "job_title": title.strip(),
+                "employer": company.strip(),
+                "salary_range": row['salary'].strip(),
+                "source": source,
+                "date_posted": date_posted,
+                "job_description": description.format(company),
+                "employer_website": url,
+                "ats_keywords": extract_keywords(f"{title} {company}")
+            })
     return jobs
 
-async def scrape_jobstreet(job_title):
-    jobs = []
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
+def format_salary(salary):
+    if salary and salary.get('minimum') and salary.get('maximum'):
+        return f"${salary['minimum']:,} - ${salary['maximum']:,}"
+    return "Competitive"
+
+# Search pages, also stored as each job's link back to the listing
+MCF_SEARCH_URL = "https://www.mycareersfuture.gov.sg/search?search={}"
+JOBSTREET_SEARCH_URL = "https://www.jobstreet.com.sg/{}-jobs"
+MCF_DESCRIPTION = "Position at {}"
+JOBSTREET_DESCRIPTION = "Opportunity at {}"
+
+# JSON endpoints the search pages themselves call; the browser is only a fallback
+MCF_API_URL = "https://api.mycareersfuture.gov.sg/v2/search"
+JOBSTREET_API_URL = "https://sg.jobstreet.com/api/jobsearch/v5/search"
+
+def is_json(response):
+    # Bot walls and error pages come back as 200 text/html; skip decoding them
+    return response.headers.get('content-type', '').startswith('application/json')
+
+async def search_mcf_api(job_title, date_posted):
+    """Returns None when the API is unavailable or its shape changed"""
+    try:
+        async with http_sem():
+            r = await HTTP.post(MCF_API_URL, params={"limit": 50, "page": 0}, json={"search": job_title})
+        r.raise_for_status()
+        if not is_json(r):
+            return None
+        rows = [{
+            "title": item.get('title') or '',
+            "company": (item.get('postedCompany') or {}).get('name') or '',
+            "salary": format_salary(item.get('salary')),
+        } for item in r.json()['results'][:50]]
+    except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    url = MCF_SEARCH_URL.format(quote(job_title))
+    return rows_to_jobs(rows, "MyCareersFuture", MCF_DESCRIPTION, url, date_posted)
+
+async def search_jobstreet_api(job_title, date_posted):
+    """Returns None when the API is unavailable or its shape changed"""
+    try:
+        async with http_sem():
+            r = await HTTP.get(JOBSTREET_API_URL, params={
+                "siteKey": "SG-Main",
+                "keywords": job_title,
+                "pageSize": 50,
+                "page": 1,
+            })
+        r.raise_for_status()
+        if not is_json(r):
+            return None
+        rows = [{
+            "title": item.get('title') or '',
+            "company": item.get('companyName') or (item.get('advertiser') or {}).get('description') or '',
+            "salary": item.get('salaryLabel') or "Competitive",
+        } for item in r.json()['data'][:50]]
+    except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    url = JOBSTREET_SEARCH_URL.format(job_title.replace(' ', '-').lower())
+    return rows_to_jobs(rows, "JobStreet", JOBSTREET_DESCRIPTION, url, date_posted)
+
+async def scrape_mcf(browser, job_title, date_posted):
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    try:
+        await context.route("**/*", block_heavy_resources)
+        page = await context.new_page()
         
-        url = f"https://www.jobstreet.com.sg/{job_title.replace(' ', '-').lower()}-jobs"
-        await page.goto(url, timeout=30000)
-        await asyncio.sleep(3)
+        url = MCF_SEARCH_URL.format(quote(job_title))
+        await page.goto(url, timeout=30000, wait_until="domcontentloaded")
+        try:
+            await page.wait_for_selector(MCF_SELECTORS[0], timeout=10000)
+        except PlaywrightTimeoutError:
+            return []
         
-        job_elements = await page.query_selector_all('article[data-testid="job-card"]')
+        rows = await page.evaluate(EXTRACT_CARDS_JS, MCF_SELECTORS)
+    finally:
+        await context.close()
+    return rows_to_jobs(rows, "MyCareersFuture", MCF_DESCRIPTION, url, date_posted)
+
+async def scrape_jobstreet(browser, job_title, date_posted):
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    try:
+        await context.route("**/*", block_heavy_resources)
+        page = await context.new_page()
         
-        for elem in job_elements[:50]:
-            try:
-                title_elem = await elem.query_selector('h1, h2, a')
-                company_elem = await elem.query_selector('[data-automation*="company"]')
-                salary_elem = await elem.query_selector('[class*="salary"]')
-                
-                title = await title_elem.inner_text() if title_elem else ""
-                company = await company_elem.inner_text() if company_elem else ""
-                salary = await salary_elem.inner_text() if salary_elem else "Competitive"
-                
-                if title and company:
-                    jobs.append({
-                        "job_title": title.strip(),
-                        "employer": company.strip(),
-                        "salary_range": salary.strip(),
-                        "source": "JobStreet",
-                        "date_posted": datetime.now().strftime("%Y-%m-%d"),
-                        "job_description": f"Opportunity at {company}",
-                        "employer_website": url,
-                        "ats_keywords": extract_keywords(f"{title} {company}")
-                    })
-            except:
-                continue
+        url = JOBSTREET_SEARCH_URL.format(job_title.replace(' ', '-').lower())
+        await page.goto(url, timeout=30000, wait_until="domcontentloaded")
+        try:
+            await page.wait_for_selector(JOBSTREET_SELECTORS[0], timeout=10000)
+        except PlaywrightTimeoutError:
+            return []
         
-        await browser.close()
-    return jobs
+        rows = await page.evaluate(EXTRACT_CARDS_JS, JOBSTREET_SELECTORS)
+    finally:
+        await context.close()
+    return rows_to_jobs(rows, "JobStreet", JOBSTREET_DESCRIPTION, url, date_posted)
+
+async def _result(value):
+    return value
+
+async def scrape_all(job_title):
+    date_posted = datetime.now().strftime("%Y-%m-%d")
+    mcf_jobs, js_jobs = await asyncio.gather(
+        search_mcf_api(job_title, date_posted),
+        search_jobstreet_api(job_title, date_posted)
+    )
+    if mcf_jobs is None or js_jobs is None:
+        # Both sites share one pooled browser, each in its own context
+        try:
+            async with pool.acquire() as browser:
+                results = await asyncio.gather(
+                    scrape_mcf(browser, job_title, date_posted) if mcf_jobs is None else _result(mcf_jobs),
+                    scrape_jobstreet(browser, job_title, date_posted) if js_jobs is None else _result(js_jobs),
+                    return_exceptions=True
+                )
+            # A site that fails to load contributes no jobs instead of failing the whole search
+            mcf_jobs, js_jobs = (r if isinstance(r, list) else [] for r in results)
+        except Exception:
+            # Chromium could not start: keep whichever API results already came back
+            mcf_jobs, js_jobs = mcf_jobs or [], js_jobs or []
+    return mcf_jobs + js_jobs
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
-        data = json.loads(post_data.decode('utf-8'))
+        data = orjson.loads(post_data)
         
         job_title = data.get('job_title', '')
         
@@ -101,18 +312,20 @@ class handler(BaseHTTPRequestHandler):
             self.send_response(400)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps({"error": "job_title required"}).encode())
+            self.wfile.write(orjson.dumps({"error": "job_title required"}))
             return
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        mcf_jobs, js_jobs = loop.run_until_complete(asyncio.gather(
-            scrape_mcf(job_title),
-            scrape_jobstreet(job_title)
-        ))
-        
-        all_jobs = mcf_jobs + js_jobs
+        try:
+            all_jobs = asyncio.run_coroutine_threadsafe(scrape_all(job_title), LOOP).result()
+        except Exception:
+            # Browser/HTTP errors carry paths and URLs; keep them in the function logs only
+            logger.exception(f"Scrape failed for: {job_title}")
+            self.send_response(500)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(orjson.dumps({"error": "scrape failed"}))
+            return
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -125,4 +338,4 @@ class handler(BaseHTTPRequestHandler):
             "jobs": all_jobs
         }
         
-        self.wfile.write(json.dumps(response).encode())
+        self.wfile.write(orjson.dumps(response))
@@ -0,0 +1,27 @@
+"""One-off migration: remove jobs whose created_at was stored as an ISO string.
+
+Jobs now store created_at as a BSON Date. Rows written before that change
+never match the TTL index, so they would never expire. Run once per
+database after deploying:
+
+    cd backend && python migrate_job_dates.py
+
+Safe to re-run; it can be deleted once every deployment has been migrated.
+"""
+from dotenv import load_dotenv
+from pymongo import MongoClient
+import os
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+def main():
+    client = MongoClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'jobseeker_db')]
+    result = db.jobs.delete_many({"created_at": {"$type": "string"}})
+    print(f"Removed {result.deleted_count} jobs with string created_at")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,57 @@
 from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-import requests
-from io import BytesIO
+import re
+from datetime import datetime, timezone
+import httpx
+import orjson
+from tempfile import SpooledTemporaryFile
 from openpyxl import Workbook
+from cachetools import TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ.get('DB_NAME', 'jobseeker_db')]
 
-app = FastAPI()
+# Shared keep-alive pool for outbound calls; the scraper can take up to a minute
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    http2=True,
+    timeout=65.0
+)
+
+async def create_indexes():
+    # TTL index expires jobs an hour after they were scraped
+    await db.jobs.create_index("created_at", expireAfterSeconds=3600)
+    await db.jobs.create_index("id", unique=True)
+    await db.jobs.create_index("employer_lower")
+    await db.jobs.create_index([("source", 1), ("employer_lower", 1)])
+    await db.favorites.create_index([("user_id", 1), ("job_id", 1)], unique=True)
+    await db.alerts.create_index([("user_id", 1), ("id", 1)])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_indexes()
+    yield
+    await http_client.aclose()
+    client.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +60,13 @@ logger = logging.getLogger(__name__)
 # Vercel scraper URL
 VERCEL_SCRAPER_URL = "https://jobseeker-app-chi.vercel.app/api/scraper"
 
+# Caps in-flight scrapes so a burst of searches can't exhaust the scraper's browser pool
+SCRAPE_SEM = asyncio.Semaphore(int(os.environ.get("MAX_CONCURRENT_SCRAPES", "4")))
+
+# Repeat searches for the same title within the TTL reuse the jobs already stored
+search_cache = TTLCache(maxsize=256, ttl=int(os.environ.get("SEARCH_CACHE_TTL", "120")))
+search_inflight: dict = {}
+
 # Models
 class Job(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -55,34 +92,33 @@ class EmailAlertCreate(BaseModel):
     job_title: str
 
 # Vercel scraping service integration
-async def scrape_jobs_from_vercel(job_title: str) -> List[Job]:
-    """Call Vercel scraping service to get real jobs"""
+async def scrape_jobs_from_vercel(job_title: str) -> List[dict]:
+    """Call Vercel scraping service to get real jobs, shaped as insertable documents"""
     jobs = []
     try:
         logger.info(f"Calling Vercel scraper for: {job_title}")
         
-        response = requests.post(
-            VERCEL_SCRAPER_URL,
-            json={"job_title": job_title},
-            timeout=65
-        )
+        response = await http_client.post(VERCEL_SCRAPER_URL, json={"job_title": job_title})
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"Vercel scraper returned {data.get('count', 0)} jobs")
             
+            created_at = datetime.now(timezone.utc)
             for job_data in data.get('jobs', []):
-                job = Job(
-                    job_title=job_data['job_title'],
-                    employer=job_data['employer'],
-                    job_description=job_data['job_description'],
-                    date_posted=job_data['date_posted'],
-                    salary_range=job_data['salary_range'],
-                    employer_website=job_data['employer_website'],
-                    ats_keywords=job_data['ats_keywords'],
-                    source=job_data['source']
-                )
-                jobs.append(job)
+                jobs.append({
+                    "id": str(uuid.uuid4()),
+                    "job_title": job_data['job_title'],
+                    "employer": job_data['employer'],
+                    "employer_lower": job_data['employer'].lower(),
+                    "job_description": job_data['job_description'],
+                    "date_posted": job_data['date_posted'],
+                    "salary_range": job_data['salary_range'],
+                    "employer_website": job_data['employer_website'],
+                    "ats_keywords": job_data['ats_keywords'],
+                    "source": job_data['source'],
+                    "created_at": created_at
+                })
         else:
             logger.error(f"Vercel scraper returned status {response.status_code}: {response.text}")
             
@@ -96,54 +132,67 @@ async def scrape_jobs_from_vercel(job_title: str) -> List[Job]:
 async def root():
     return {"message": "Job Seeker API"}
 
-@api_router.post("/jobs/search")
-async def search_jobs(request: JobSearchRequest):
-    logger.info(f"Searching for: {request.job_title}")
-    
-    # Clear old jobs
-    await db.jobs.delete_many({"created_at": {"$lt": datetime.now(timezone.utc) - timedelta(hours=1)}})
-    
+async def run_search(job_title: str) -> dict:
     # Use Vercel scraper
-    all_jobs = await scrape_jobs_from_vercel(request.job_title)
+    async with SCRAPE_SEM:
+        all_jobs = await scrape_jobs_from_vercel(job_title)
     all_jobs = all_jobs[:200]
     
     if all_jobs:
-        jobs_dict = []
-        for job in all_jobs:
-            job_dict = job.model_dump()
-            job_dict['created_at'] = job_dict['created_at'].isoformat()
-            jobs_dict.append(job_dict)
-        await db.jobs.insert_many(jobs_dict)
+        try:
+            await db.jobs.insert_many(all_jobs, ordered=False, bypass_document_validation=True)
+        except BulkWriteError as e:
+            # Unordered: the rest of the batch is still written, only log the rejects
+            logger.error(f"Failed to insert {len(e.details.get('writeErrors', []))} of {len(all_jobs)} jobs")
     
     return {"success": True, "count": len(all_jobs), "message": f"Found {len(all_jobs)} jobs"}
 
+def finish_search(cache_key: str, task: asyncio.Task):
+    search_inflight.pop(cache_key, None)
+    # Failed scrapes raise or come back empty; don't pin either for the whole TTL
+    if not task.cancelled() and task.exception() is None and task.result()["count"]:
+        search_cache[cache_key] = task.result()
+
+@api_router.post("/jobs/search")
+async def search_jobs(request: JobSearchRequest):
+    logger.info(f"Searching for: {request.job_title}")
+    
+    cache_key = request.job_title.strip().lower()
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Concurrent searches for the same title share one scrape instead of each inserting a batch
+    task = search_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(run_search(request.job_title))
+        search_inflight[cache_key] = task
+        task.add_done_callback(lambda t: finish_search(cache_key, t))
+    # shield: one client disconnecting must not cancel the scrape the others are waiting on
+    return await asyncio.shield(task)
+
 @api_router.get("/jobs", response_model=List[Job])
 async def get_jobs(employer: Optional[str] = None, source: Optional[str] = None):
     query = {}
     if employer:
-        query["employer"] = {"$regex": employer, "$options": "i"}
+        # Case-sensitive anchored prefix on the lowercased copy is a bounded index scan
+        query["employer_lower"] = {"$regex": f"^{re.escape(employer.lower())}"}
     if source:
         query["source"] = source
     
-    jobs = await db.jobs.find(query, {"_id": 0}).to_list(200)
-    for job in jobs:
-        if isinstance(job['created_at'], str):
-            job['created_at'] = datetime.fromisoformat(job['created_at'])
+    jobs = await db.jobs.find(query, {"_id": 0, "employer_lower": 0}).limit(200).batch_size(200).to_list(200)
     return jobs
 
 @api_router.post("/jobs/favorite")
 async def add_favorite(request: FavoriteJobCreate):
-    existing = await db.favorites.find_one({"job_id": request.job_id, "user_id": "default_user"}, {"_id": 0})
-    if existing:
-        return existing
-    
-    favorite = {
-        "id": str(uuid.uuid4()),
-        "job_id": request.job_id,
-        "user_id": "default_user",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.favorites.insert_one(favorite)
+    # One round trip: returns the existing favorite or inserts and returns a new one
+    favorite = await db.favorites.find_one_and_update(
+        {"job_id": request.job_id, "user_id": "default_user"},
+        {"$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0}
+    )
     return favorite
 
 @api_router.delete("/jobs/favorite/{job_id}")
@@ -153,12 +202,18 @@ async def remove_favorite(job_id: str):
 
 @api_router.get("/jobs/favorites")
 async def get_favorites():
-    favorites = await db.favorites.find({"user_id": "default_user"}, {"_id": 0}).to_list(1000)
-    job_ids = [fav['job_id'] for fav in favorites]
-    jobs = await db.jobs.find({"id": {"$in": job_ids}}, {"_id": 0}).to_list(1000)
-    for job in jobs:
-        if isinstance(job['created_at'], str):
-            job['created_at'] = datetime.fromisoformat(job['created_at'])
+    # Server-side join: one round trip instead of favorites then jobs
+    pipeline = [
+        {"$match": {"user_id": "default_user"}},
+        {"$limit": 1000},
+        # Only job_id is needed for the join, so (user_id, job_id) covers this stage
+        {"$project": {"_id": 0, "job_id": 1}},
+        {"$lookup": {"from": "jobs", "localField": "job_id", "foreignField": "id", "as": "job"}},
+        {"$unwind": "$job"},
+        {"$replaceRoot": {"newRoot": "$job"}},
+        {"$project": {"_id": 0, "employer_lower": 0}}
+    ]
+    jobs = await db.favorites.aggregate(pipeline, batchSize=1000).to_list(1000)
     return jobs
 
 @api_router.post("/alerts")
@@ -169,14 +224,15 @@ async def create_alert(request: EmailAlertCreate):
         "job_title": request.job_title,
         "user_id": "default_user",
         "active": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
-    await db.alerts.insert_one(alert)
+    # insert_one adds an ObjectId _id to the dict it is given, which can't be serialized
+    await db.alerts.insert_one(alert.copy())
     return alert
 
 @api_router.get("/alerts")
 async def get_alerts():
-    alerts = await db.alerts.find({"user_id": "default_user"}, {"_id": 0}).to_list(1000)
+    alerts = await db.alerts.find({"user_id": "default_user"}, {"_id": 0}).limit(1000).batch_size(1000).to_list(1000)
     return alerts
 
 @api_router.delete("/alerts/{alert_id}")
@@ -184,18 +240,25 @@ async def delete_alert(alert_id: str):
     result = await db.alerts.delete_one({"id": alert_id, "user_id": "default_user"})
     return {"success": result.deleted_count > 0}
 
+def iter_file(f, chunk_size: int = 64 * 1024):
+    try:
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
 @api_router.get("/jobs/export")
 async def export_jobs():
-    jobs = await db.jobs.find({}, {"_id": 0}).to_list(200)
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Jobs"
+    # write_only streams rows out instead of keeping every Cell object in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Jobs")
     
     headers = ['Job Title', 'Employer', 'Job Description', 'Date Posted', 'Salary Range', 'Employer Website', 'ATS Keywords', 'Source']
     ws.append(headers)
     
-    for job in jobs:
+    projection = {"_id": 0, "job_title": 1, "employer": 1, "job_description": 1, "date_posted": 1,
+                  "salary_range": 1, "employer_website": 1, "ats_keywords": 1, "source": 1}
+    async for job in db.jobs.find({}, projection).limit(200).batch_size(200):
         ws.append([
             job.get('job_title', ''),
             job.get('employer', ''),
@@ -207,26 +270,26 @@ async def export_jobs():
             job.get('source', '')
         ])
     
-    excel_file = BytesIO()
-    wb.save(excel_file)
+    excel_file = SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    await asyncio.to_thread(wb.save, excel_file)
     excel_file.seek(0)
     
     return StreamingResponse(
-        excel_file,
+        iter_file(excel_file),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": "attachment; filename=jobs_export.xlsx"}
     )
 
 app.include_router(api_router)
 
+cors_origins = [o.strip() for o in os.environ.get('CORS_ORIGINS', '*').split(',') if o.strip()]
+# Credentials with a wildcard origin would make Starlette echo back any caller's Origin
+cors_allow_credentials = cors_origins != ['*']
+
 app.add_middleware(
     CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_credentials=cors_allow_credentials,
+    allow_origins=cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()